@@ -1,27 +1,186 @@
 import requests
+import orjson
 import os
-from collections import defaultdict
-from datetime import datetime
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from hashlib import sha256
+from urllib.parse import parse_qs, quote, urlparse
 import urllib3
 import logging
+from requests.adapters import HTTPAdapter
+from requests_cache import CachedSession, create_key
+from urllib3.util.retry import Retry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Environment defaults, read once at import rather than on every call
+_ENV_USERNAME = os.getenv("GITHUB_USERNAME")
+_ENV_ENTERPRISE_URL = os.getenv("GITHUB_ENTERPRISE_URL")
+_ENV_TOKEN = os.getenv("GITHUB_TOKEN")
+_ENV_IS_ENTERPRISE = os.getenv("GITHUB_IS_ENTERPRISE", "False").lower() == "true"
+_ENV_START_DATE = os.getenv("GITHUB_START_DATE")
+_ENV_END_DATE = os.getenv("GITHUB_END_DATE")
+_ENV_VERIFY_SSL = os.getenv("GITHUB_VERIFY_SSL", "True").lower() == "true"
+
+MAX_WORKERS = 16
+REQUEST_TIMEOUT = 10
+
+CACHE_NAME = "gh_cache"
+CACHE_EXPIRE_SECONDS = 600
+
+def cache_key(request, **kwargs):
+    """Cache key that also covers a hash of the token, so responses are never
+    shared between tokens and the token itself is never written to the cache."""
+    token_hash = sha256(request.headers.get("Authorization", "").encode()).hexdigest()
+    return sha256(f"{create_key(request, **kwargs)}:{token_hash}".encode()).hexdigest()[:32]
+
+def drop_vary_header(response, *args, **kwargs):
+    """Removes Vary so requests_cache can reuse authenticated responses.
+
+    GitHub sends "Vary: Accept, Authorization, ...", and requests_cache treats a
+    Vary on the (redacted) Authorization header as a permanent cache miss. The
+    token is already part of cache_key and the other headers never change here.
+    """
+    response.headers.pop("Vary", None)
+    return response
+
+# Shared session so every worker thread reuses pooled keep-alive connections.
+# Responses are cached on disk; stale entries are revalidated with their ETag,
+# and GitHub does not charge rate limit for the resulting 304s.
+SESSION = CachedSession(CACHE_NAME, backend="sqlite", expire_after=CACHE_EXPIRE_SECONDS, cache_control=True, key_fn=cache_key)
+SESSION.hooks["response"].append(drop_vary_header)
+_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[502, 503, 504]),
+)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+# Time (epoch seconds) before which no worker should send another request
+_rate_limit_resume_at = 0.0
+_rate_limit_lock = threading.Lock()
+
+def wait_for_rate_limit_reset():
+    """Sleeps until any rate limit pause recorded by a worker has passed."""
+    with _rate_limit_lock:
+        wait_seconds = _rate_limit_resume_at - time.time()
+    if wait_seconds > 0:
+        time.sleep(wait_seconds)
+
+def record_rate_limit(response):
+    """Pauses the whole pool if a fresh response says the rate limit is exhausted.
+
+    Returns True if the limit was exhausted. Cached responses carry stale headers and are ignored.
+    """
+    global _rate_limit_resume_at
+    if getattr(response, "from_cache", False) or response.headers.get("X-RateLimit-Remaining") != "0":
+        return False
+
+    reset_at = int(response.headers.get("X-RateLimit-Reset", 0))
+    with _rate_limit_lock:
+        if reset_at > _rate_limit_resume_at:
+            _rate_limit_resume_at = reset_at
+            logging.warning(f"GitHub rate limit exhausted. Pausing requests for {max(reset_at - time.time(), 0):.0f}s until it resets.")
+    return True
+
+def github_get(url, headers, verify_ssl):
+    """GETs a GitHub API URL, pausing instead of firing requests that would be rate limited."""
+    wait_for_rate_limit_reset()
+    response = SESSION.get(url, headers=headers, verify=verify_ssl, timeout=REQUEST_TIMEOUT)
+    if record_rate_limit(response) and response.status_code in (403, 429):
+        # The request itself was rejected; retry it once the window has reset.
+        # Cached entries are revalidated with If-None-Match by the session.
+        wait_for_rate_limit_reset()
+        response = SESSION.get(url, headers=headers, verify=verify_ssl, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response
+
+def decode_json(response):
+    """Decodes a response body, raising a RequestException if it is not JSON.
+
+    Proxies and SSO login pages can answer 200 with HTML; callers handle that
+    like any other failed request.
+    """
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError as e:
+        raise requests.exceptions.InvalidJSONError(f"Invalid JSON from {response.url}: {e}", response=response) from e
+
+def fetch_json(url, headers, verify_ssl):
+    """Fetches a GitHub API URL through the shared session and returns the decoded JSON."""
+    response = github_get(url, headers, verify_ssl)
+    return decode_json(response)
+
+def fetch_all_pages(url, headers, verify_ssl, executor):
+    """Fetches every page of a paginated listing, requesting pages 2..N concurrently.
+
+    Returns the decoded page bodies in page order.
+    """
+    response = github_get(f"{url}&page=1", headers, verify_ssl)
+    pages = [decode_json(response)]
+
+    # The "last" link tells us the page count up front, so the remaining
+    # pages can be fetched in parallel rather than walked one by one.
+    last_url = response.links.get("last", {}).get("url")
+    if not last_url:
+        return pages
+
+    last_page = int(parse_qs(urlparse(last_url).query)["page"][0])
+    page_urls = [f"{url}&page={page}" for page in range(2, last_page + 1)]
+    pages.extend(executor.map(lambda page_url: fetch_json(page_url, headers, verify_ssl), page_urls))
+    return pages
+
+def fetch_linked_pages(url, headers, verify_ssl):
+    """Fetches every page of a listing by following rel="next" links in turn.
+
+    Unlike fetch_all_pages this never submits to the executor, so it is safe to
+    run from inside a worker.
+    """
+    items = []
+    while url:
+        response = github_get(url, headers, verify_ssl)
+        items.extend(decode_json(response))
+        url = response.links.get("next", {}).get("url")
+    return items
+
+def search_pull_requests(base_api_url, query, headers, verify_ssl, executor):
+    """Returns every pull request matching a search query that the search API will return."""
+    search_url = f"{base_api_url}/search/issues?q={quote(f'{query} is:pr')}&per_page=100"
+    pages = fetch_all_pages(search_url, headers, verify_ssl, executor)
+    items = [item for page in pages for item in page['items']]
+
+    # The search API returns at most 1000 results and may time out with a
+    # partial result set; either way the counts derived from it are too low.
+    total_count = pages[0]['total_count']
+    if total_count > len(items):
+        logging.warning(f"Search '{query}' matched {total_count} pull requests but only {len(items)} could be retrieved. "
+                        "Counts will be incomplete; narrow the date range.")
+    if any(page.get('incomplete_results') for page in pages):
+        logging.warning(f"Search '{query}' timed out and returned incomplete results. Counts may be incomplete.")
+
+    # Search results can shift between pages while they are fetched in
+    # parallel, so a pull request may show up twice. Keep one entry per URL
+    # so it is neither fetched nor counted again.
+    return list({item['url']: item for item in items}.values())
+
 def get_user_contributions(username=None, enterprise_url=None, github_token=None, is_enterprise=False, start_date=None, end_date=None, verify_ssl=None):
-    """Retrieves user contributions from all accessible repositories."""
+    """Retrieves user contributions from pull requests found through the GitHub search API."""
 
-    username = username or os.getenv("GITHUB_USERNAME")
-    enterprise_url = enterprise_url or os.getenv("GITHUB_ENTERPRISE_URL")
-    github_token = github_token or os.getenv("GITHUB_TOKEN")
-    is_enterprise = is_enterprise or os.getenv("GITHUB_IS_ENTERPRISE", "False").lower() == "true"
-    start_date = start_date or os.getenv("GITHUB_START_DATE")
-    end_date = end_date or os.getenv("GITHUB_END_DATE")
+    username = username or _ENV_USERNAME
+    enterprise_url = enterprise_url or _ENV_ENTERPRISE_URL
+    github_token = github_token or _ENV_TOKEN
+    is_enterprise = is_enterprise or _ENV_IS_ENTERPRISE
+    start_date = start_date or _ENV_START_DATE
+    end_date = end_date or _ENV_END_DATE
 
     if verify_ssl is None:
-        verify_ssl = os.getenv("GITHUB_VERIFY_SSL", "True").lower() == "true"
+        verify_ssl = _ENV_VERIFY_SSL
 
     if not username or not github_token:
         logging.error("Missing required inputs.")
@@ -38,106 +197,94 @@ def get_user_contributions(username=None, enterprise_url=None, github_token=None
     valid_comments = 0
     lines_added = 0
     lines_deleted = 0
-    repo_contributions = defaultdict(int)
-
-    start_datetime = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
-    end_datetime = datetime.strptime(end_date, "%Y-%m-%d") if end_date else None
-
-    repos_url = f"{base_api_url}/user/repos?per_page=100"
-    all_repos = []
-    page = 1
-    while True:
+    repo_contributions = Counter()
+
+    # The date range is applied by the search API so only in-range pull
+    # requests are transferred.
+    if start_date and end_date:
+        created_qualifier = f" created:{start_date}..{end_date}"
+    elif start_date:
+        created_qualifier = f" created:>={start_date}"
+    elif end_date:
+        created_qualifier = f" created:<={end_date}"
+    else:
+        created_qualifier = ""
+
+    repo_url_prefix = f"{base_api_url}/repos/"
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         try:
-            logging.info(f"Fetching all user accessible repositories. Page {page}")
-            response = requests.get(f"{repos_url}&page={page}", headers=headers, verify=verify_ssl)
-            response.raise_for_status()
-            repos = response.json()
-            if not repos:
-                break
-            all_repos.extend(repos)
-            page += 1
+            logging.info("Searching pull requests authored by the user.")
+            authored_pulls = search_pull_requests(base_api_url, f"author:{username}{created_qualifier}", headers, verify_ssl, executor)
         except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching repositories: {e}")
+            logging.error(f"Error searching pull requests: {e}")
             return None
 
-    logging.info(f"Processing {len(all_repos)} repositories.")
+        logging.info(f"Processing {len(authored_pulls)} authored pull requests.")
 
-    for repo in all_repos:
-        repo_full_name = repo["full_name"]
-        logging.info(f"Processing repository: {repo_full_name}")
-        repo_contributions[repo_full_name] = 0
+        pull_details_futures = {}
+        for item in authored_pulls:
+            repo_full_name = item['repository_url'].removeprefix(repo_url_prefix)
+            repo_contributions[repo_full_name] += 1
+            # Only the single pull request endpoint carries additions/deletions;
+            # search results omit them.
+            future = executor.submit(fetch_json, item['pull_request']['url'], headers, verify_ssl)
+            pull_details_futures[future] = (repo_full_name, item['number'])
 
-        pulls_url = f"{base_api_url}/repos/{repo_full_name}/pulls?state=all"
+        # Only pull requests the user actually reviewed are visited, rather
+        # than listing every pull request of every accessible repository.
         try:
-            response = requests.get(pulls_url, headers=headers, verify=verify_ssl)
-            response.raise_for_status()
-            pulls = response.json()
+            logging.info("Searching pull requests reviewed by the user.")
+            reviewed_pulls = search_pull_requests(base_api_url, f"reviewed-by:{username}{created_qualifier}", headers, verify_ssl, executor)
         except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching pulls for {repo_full_name}: {e}")
-            continue
+            logging.error(f"Error searching pull requests: {e}")
+            return None
 
-        logging.info(f"Processing {len(pulls)} pull requests for {repo_full_name}")
+        logging.info(f"Processing {len(reviewed_pulls)} reviewed pull requests.")
 
-        for pull in pulls:
-            pull_number = pull.get('number')
-            logging.info(f"Processing pull request {pull_number} in {repo_full_name}")
+        reviews_futures = {}
+        for item in reviewed_pulls:
+            repo_full_name = item['repository_url'].removeprefix(repo_url_prefix)
+            reviews_url = f"{item['pull_request']['url']}/reviews?per_page=100"
+            reviews_futures[executor.submit(fetch_linked_pages, reviews_url, headers, verify_ssl)] = (repo_full_name, item['number'])
 
-            pull_created_at = datetime.strptime(pull.get('created_at'), "%Y-%m-%dT%H:%M:%SZ")
-            if (start_datetime and pull_created_at < start_datetime) or (end_datetime and pull_created_at > end_datetime):
-                logging.info(f"Pull request {pull_number} out of date range. Skipping.")
+        for future in as_completed(pull_details_futures):
+            repo_full_name, pull_number = pull_details_futures[future]
+            try:
+                pull_details = future.result()
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Error fetching details for PR {pull_number} in {repo_full_name}: {e}")
                 continue
 
-            if pull.get('user', {}).get('login') == username:
-                repo_contributions[repo_full_name] += 1
-                commits_url = pull.get('commits_url')
-                try:
-                    commits_response = requests.get(commits_url, headers=headers, verify=verify_ssl)
-                    commits_response.raise_for_status()
-                    commits = commits_response.json()
-                except requests.exceptions.RequestException as e:
-                    logging.error(f"Error fetching commits for PR {pull_number} in {repo_full_name}: {e}")
-                    continue
-
-                logging.info(f"Processing {len(commits)} commits for PR {pull_number} in {repo_full_name}")
-                for commit in commits:
-                    commit_sha = commit.get('sha')
-                    logging.info(f"Processing commit {commit_sha} in PR {pull_number} in {repo_full_name}")
-                    commit_url = commit.get('url')
-                    try:
-                        commit_details_response = requests.get(commit_url, headers=headers, verify=verify_ssl)
-                        commit_details_response.raise_for_status()
-                        commit_details = commit_details_response.json()
-                    except requests.exceptions.RequestException as e:
-                        logging.error(f"Error fetching commit details for commit {commit_sha} in {repo_full_name}: {e}")
-                        continue
-
-                    lines_added += commit_details.get('stats', {}).get('additions', 0)
-                    lines_deleted += commit_details.get('stats', {}).get('deletions', 0)
-
-            reviews_url = pull.get('review_comments_url').replace("comments", "reviews")
+            lines_added += pull_details.get('additions', 0)
+            lines_deleted += pull_details.get('deletions', 0)
+
+        # GitHub logins are case-insensitive; compare against a lowercased copy
+        # computed once rather than per review.
+        login = username.lower()
+        for future in as_completed(reviews_futures):
+            repo_full_name, pull_number = reviews_futures[future]
             try:
-                reviews_response = requests.get(reviews_url, headers=headers, verify=verify_ssl)
-                reviews_response.raise_for_status()
-                reviews = reviews_response.json()
+                reviews = future.result()
             except requests.exceptions.RequestException as e:
                 logging.error(f"Error fetching reviews for PR {pull_number} in {repo_full_name}: {e}")
                 continue
 
-            logging.info(f"Processing {len(reviews)} reviews for PR {pull_number} in {repo_full_name}")
+            logging.debug("Processing %d reviews for PR %s in %s", len(reviews), pull_number, repo_full_name)
             for review in reviews:
-                if review.get('user', {}).get('login') == username:
+                user = review.get('user')
+                if user and user['login'].lower() == login:
                     pull_requests_reviewed += 1
-                    if review.get('body') and len(review.get('body')) > 10:
+                    body = review.get('body')
+                    if body and len(body) > 10:
                         valid_comments += 1
 
-    top_repos = sorted(repo_contributions.items(), key=lambda item: item[1], reverse=True)[:3]
+    top_repos = repo_contributions.most_common(3)
 
     user_name = username
     try:
         user_info_url = f"{base_api_url}/users/{username}"
-        response = requests.get(user_info_url, headers=headers, verify=verify_ssl)
-        response.raise_for_status()
-        user_info = response.json()
+        user_info = fetch_json(user_info_url, headers, verify_ssl)
         user_name = user_info.get("name", username)
     except requests.exceptions.RequestException as e:
         logging.error(f"Error fetching user info: {e}")
@@ -156,10 +303,7 @@ def get_user_contributions(username=None, enterprise_url=None, github_token=None
 
     return results
 
-def generate_html_report(results):
-    """Generates an HTML report from the user contribution results."""
-
-    html = """
+REPORT_HEADER = """
     <html>
     <head>
     <style>
@@ -176,12 +320,7 @@ def generate_html_report(results):
     <div class="header"><h2>User Contribution Report</h2></div>
     """
 
-    if results['start_date'] or results['end_date']:
-        html += f"<p><strong>Date Range:</strong> {results['start_date'] or 'N/A'} - {results['end_date'] or 'N/A'}</p>"
-
-    html += f"<p><strong>User:</strong> {results['user_name']}</p>"
-
-    html += """
+REPORT_METRICS_TABLE = """
     <table>
     <tr><th>Metric</th><th>Value</th></tr>
     <tr><td>Pull Requests Reviewed</td><td>{pull_requests_reviewed}</td></tr>
@@ -189,13 +328,24 @@ def generate_html_report(results):
     <tr><td>Lines Added</td><td>{lines_added}</td></tr>
     <tr><td>Lines Deleted</td><td>{lines_deleted}</td></tr>
     <tr><td>Lines Modified</td><td>{lines_modified}</td></tr>
-    <tr><td>Top 3 Active Repositories</td><td><ul class="repo-list">""".format(**results)
+    <tr><td>Top 3 Active Repositories</td><td><ul class="repo-list">"""
+
+REPORT_FOOTER = "</ul></td></tr></table></body></html>"
+
+def generate_html_report(results):
+    """Generates an HTML report from the user contribution results."""
+
+    parts = [REPORT_HEADER]
+
+    if results['start_date'] or results['end_date']:
+        parts.append(f"<p><strong>Date Range:</strong> {results['start_date'] or 'N/A'} - {results['end_date'] or 'N/A'}</p>")
 
-    for repo, count in results['top_repositories']:
-        html += f"<li>{repo}: {count} interactions</li>"
-    html += "</ul></td></tr></table></body></html>"
+    parts.append(f"<p><strong>User:</strong> {results['user_name']}</p>")
+    parts.append(REPORT_METRICS_TABLE.format(**results))
+    parts.extend(f"<li>{repo}: {count} interactions</li>" for repo, count in results['top_repositories'])
+    parts.append(REPORT_FOOTER)
 
-    return html
+    return "".join(parts)
 
 # Example usage (using environment variables):
 results = get_user_contributions()
@@ -21,7 +21,7 @@ source venv/bin/activate
 
 # Install required packages
 pip install --upgrade pip
-pip install requests
+pip install requests requests-cache orjson
 
 # Run the analysis script
 python analyse.py